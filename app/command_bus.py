@@ -3,25 +3,52 @@ Command Bus: valida DTO e inoltra all'adapter PyWwise.
 Questa versione intercetta SEMPRE le eccezioni (es. WAAPI down) e
 normalizza res.data in dict per evitare AttributeError a valle.
 """
-from typing import Dict, Any
-from .pywwise_adapter import PyWwiseAgent, WwiseResult
+import threading
+from operator import attrgetter
+from typing import Dict, Any, Callable, List, Optional
+from .pywwise_adapter import PyWwiseAgent, WwiseResult, TRANSPORT_ERROR
 
 def _exc(e: Exception, code: str = "WAAPI_CONNECT_FAILED") -> Dict[str, Any]:
     return {"ok": False, "error": str(e), "code": code}
 
+# attributi comuni di WwiseObjectInfo
+_PLAIN_ATTRS = ("id", "name", "type", "path")
+# tipo -> estrattore (None se il tipo non ha nessuno degli attributi)
+_EXTRACTOR_CACHE: Dict[type, Optional[Callable[[Any], Dict[str, Any]]]] = {}
+
+def _build_extractor(obj: Any) -> Optional[Callable[[Any], Dict[str, Any]]]:
+    keys = tuple(attr for attr in _PLAIN_ATTRS if hasattr(obj, attr))
+    if not keys:
+        return None
+    getter = attrgetter(*keys)
+    if len(keys) == 1:
+        # attrgetter con un solo attributo restituisce lo scalare
+        key = keys[0]
+        return lambda o: {key: getter(o)}
+    return lambda o: dict(zip(keys, getter(o)))
+
 def _to_plain(obj: Any) -> Any:
     """Converte WwiseObjectInfo (o oggetti simili) in dict minimale."""
     if obj is None:
         return None
     if isinstance(obj, dict):
         return obj
-    # prova con attributi comuni di WwiseObjectInfo
-    plain = {}
-    for attr in ("id", "name", "type", "path"):
-        if hasattr(obj, attr):
-            plain[attr] = getattr(obj, attr)
-    if plain:
-        return plain
+    if isinstance(obj, list):
+        return [_to_plain(o) for o in obj]
+    # estrattore calcolato una volta per tipo
+    cls = type(obj)
+    try:
+        extractor = _EXTRACTOR_CACHE[cls]
+    except KeyError:
+        extractor = _EXTRACTOR_CACHE[cls] = _build_extractor(obj)
+    if extractor is not None:
+        try:
+            return extractor(obj)
+        except AttributeError:
+            # istanza con attributi diversi dal resto del tipo
+            extractor = _build_extractor(obj)
+            if extractor is not None:
+                return extractor(obj)
     # fallback: prova __dict__ oppure repr
     try:
         d = dict(obj.__dict__)
@@ -34,40 +61,90 @@ def _to_plain(obj: Any) -> Any:
         return {"repr": repr(obj)}
 
 def _normalize(res: WwiseResult) -> Dict[str, Any]:
+    code = res.code
+    # fast path: successo senza payload
+    if res.ok and res.data is None and res.error is None and code is None:
+        return {"ok": True}
     out = {"ok": res.ok}
     if res.error:
         out["error"] = res.error
-    if hasattr(res, "code") and getattr(res, "code") is not None:
-        out["code"] = getattr(res, "code")
+    if code is not None:
+        out["code"] = code
     if res.data is not None:
         out["data"] = _to_plain(res.data)
     return out
 
 class CommandBus:
+    """
+    Tiene una sola connessione WAAPI per tutta la vita del bus:
+    l'agent viene connesso al primo comando e riusato dai successivi.
+    Solo gli errori di trasporto (code TRANSPORT_ERROR dall'adapter, es.
+    Wwise riavviato nel frattempo) scartano la connessione; se era riusata
+    da un comando precedente, il comando viene ritentato una volta su una
+    connessione nuova. Gli errori logici WAAPI (parent inesistente, ecc.)
+    vengono restituiti così come sono, senza ritentare: ripetere una
+    create già arrivata a Wwise creerebbe un duplicato. Se la connessione
+    non riesce (Wwise non avviato) l'errore torna subito, senza retry.
+    """
     def __init__(self):
-        pass
+        self._agent: Optional[PyWwiseAgent] = None
+        self._lock = threading.RLock()
+
+    def _get_agent(self) -> PyWwiseAgent:
+        if self._agent is None:
+            self._agent = PyWwiseAgent().connect()
+        return self._agent
+
+    def _drop_agent(self):
+        agent, self._agent = self._agent, None
+        if agent is not None:
+            try:
+                agent.__exit__(None, None, None)
+            except Exception:
+                pass
+
+    def _call(self, op: Callable[[PyWwiseAgent], WwiseResult]) -> Dict[str, Any]:
+        with self._lock:
+            reused = self._agent is not None
+            try:
+                res = op(self._get_agent())
+            except Exception as e:
+                self._drop_agent()
+                return _exc(e)
+            if res.code == TRANSPORT_ERROR:
+                self._drop_agent()
+                if reused:
+                    try:
+                        res = op(self._get_agent())
+                    except Exception as e:
+                        self._drop_agent()
+                        return _exc(e)
+                    if res.code == TRANSPORT_ERROR:
+                        self._drop_agent()
+            return _normalize(res)
+
+    def close(self):
+        """Chiude la connessione WAAPI condivisa (se aperta)"""
+        with self._lock:
+            self._drop_agent()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
 
     def create_sound(self, payload: Dict[str, Any]) -> Dict[str, Any]:
         name = payload.get("name") or "Sound"
         parent = payload.get("parentPath")
-        try:
-            with PyWwiseAgent() as agent:
-                res: WwiseResult = agent.create_sound(name=name, parent_path=parent)
-                return _normalize(res)
-        except Exception as e:
-            return _exc(e)
+        return self._call(lambda agent: agent.create_sound(name=name, parent_path=parent))
 
     def set_output_bus(self, payload: Dict[str, Any]) -> Dict[str, Any]:
         obj = payload.get("objectId")
         bus = payload.get("busPath")
         if not obj or not bus:
             return {"ok": False, "error": "objectId e busPath sono obbligatori", "code": "INVALID_INPUT"}
-        try:
-            with PyWwiseAgent() as agent:
-                res: WwiseResult = agent.set_output_bus(obj, bus)
-                return _normalize(res)
-        except Exception as e:
-            return _exc(e)
+        return self._call(lambda agent: agent.set_output_bus(obj, bus))
 
     def audio_import(self, payload: Dict[str, Any]) -> Dict[str, Any]:
         obj = payload.get("objectId")
@@ -75,17 +152,37 @@ class CommandBus:
         lang = payload.get("language", "SFX")
         if not obj or not path:
             return {"ok": False, "error": "objectId e filePath sono obbligatori", "code": "INVALID_INPUT"}
-        try:
-            with PyWwiseAgent() as agent:
-                res: WwiseResult = agent.audio_import(obj, path, lang)
-                return _normalize(res)
-        except Exception as e:
-            return _exc(e)
+        return self._call(lambda agent: agent.audio_import(obj, path, lang))
+
+    def audio_import_batch(self, payloads: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Importa più file con una sola chiamata WAAPI.
+        Restituisce un risultato per payload, nello stesso ordine.
+        """
+        items = []
+        for payload in payloads:
+            obj = payload.get("objectId")
+            path = payload.get("filePath")
+            if not obj or not path:
+                invalid = {"ok": False, "error": "objectId e filePath sono obbligatori", "code": "INVALID_INPUT"}
+                return [dict(invalid) for _ in payloads]
+            items.append({"objectId": obj, "filePath": path, "language": payload.get("language", "SFX")})
+        res = self._call(lambda agent: agent.audio_import_batch(items))
+        if not res.get("ok"):
+            return [dict(res) for _ in payloads]
+        # Esito per item: un file fallito dentro il batch resta sul suo nodo
+        results = []
+        for entry in res["data"]:
+            error = entry.pop("error", None)
+            if error is None:
+                results.append({"ok": True, "data": entry})
+            else:
+                results.append({"ok": False, "error": error, "code": "IMPORT_FAILED", "data": entry})
+        return results
 
     def project_save(self, payload: Dict[str, Any]) -> Dict[str, Any]:
-        try:
-            with PyWwiseAgent() as agent:
-                res: WwiseResult = agent.project_save()
-                return _normalize(res)
-        except Exception as e:
-            return _exc(e)
+        return self._call(lambda agent: agent.project_save())
+
+    def get_info(self) -> Dict[str, Any]:
+        """Info su Wwise (versione, piattaforma) sulla connessione condivisa"""
+        return self._call(lambda agent: agent.get_info())
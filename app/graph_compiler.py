@@ -8,9 +8,15 @@ Fasi:
 4. Valida input obbligatori
 5. Restituisce piano ordinato o errori di compilazione
 """
-from typing import Dict, Any, List, Set, Optional, Tuple
-from collections import defaultdict, deque
-from .node_registry import get_registry
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Set, FrozenSet, Optional, Tuple
+from .node_registry import get_registry, NodeSpec
+
+_NO_OUTPUTS: FrozenSet[str] = frozenset()
+
+# Stat concorrenti in validate_workflow
+_STAT_WORKERS = 8
 
 
 class CompilationError(Exception):
@@ -34,6 +40,16 @@ def compile_workflow(flow: Dict[str, Any]) -> Dict[str, Any]:
         warnings: List[Dict]  # Warning non bloccanti
     }
     """
+    return compile_workflow_with_specs(flow)[0]
+
+
+def compile_workflow_with_specs(flow: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, NodeSpec]]:
+    """
+    Come compile_workflow, ma restituisce anche le NodeSpec già risolte
+    (nodeId -> spec; vuoto se la compilazione fallisce). Il runner le
+    riusa senza ripetere il lookup nel registry; il risultato JSON resta
+    serializzabile così com'è.
+    """
     try:
         nodes = flow.get("nodes", [])
         edges = flow.get("edges", [])
@@ -41,9 +57,23 @@ def compile_workflow(flow: Dict[str, Any]) -> Dict[str, Any]:
         # 1. Indicizza nodi
         node_map = {n["id"]: n for n in nodes}
         
+        # Risolvi una sola volta la specifica di ogni nodo (fail fast)
+        registry = get_registry()
+        specs: Dict[str, NodeSpec] = {}
+        for node_id, node in node_map.items():
+            spec = registry.get(node.get("type"))
+            if not spec:
+                raise CompilationError(
+                    "UNKNOWN_NODE_TYPE",
+                    f"Tipo nodo sconosciuto: {node.get('type')}",
+                    node_id
+                )
+            specs[node_id] = spec
+        
         # 2. Costruisci grafo delle dipendenze
-        graph = defaultdict(list)  # node_id -> [dependent_node_ids]
-        in_degree = defaultdict(int)
+        graph: Dict[str, List[str]] = {}  # node_id -> [dependent_node_ids]
+        in_degree = {nid: 0 for nid in node_map}
+        incoming_by_target: Dict[str, List[Dict]] = {}  # node_id -> [edge entranti]
         
         for edge in edges:
             source = edge.get("source")
@@ -69,63 +99,50 @@ def compile_workflow(flow: Dict[str, Any]) -> Dict[str, Any]:
                     target
                 )
             
-            graph[source].append(target)
+            graph.setdefault(source, []).append(target)
             in_degree[target] += 1
-        
-        # Inizializza in_degree per tutti i nodi
-        for node in nodes:
-            if node["id"] not in in_degree:
-                in_degree[node["id"]] = 0
+            incoming_by_target.setdefault(target, []).append(edge)
         
         # 3. Toposort (Kahn's algorithm)
-        ordered = []
-        queue = deque([nid for nid, deg in in_degree.items() if deg == 0])
+        # La lista viene estesa mentre la si scorre: stesso ordine FIFO
+        # di una deque, senza popleft
+        ordered = [nid for nid, deg in in_degree.items() if deg == 0]
         
-        while queue:
-            current = queue.popleft()
-            ordered.append(current)
-            
-            for neighbor in graph[current]:
+        for current in ordered:
+            for neighbor in graph.get(current, ()):
                 in_degree[neighbor] -= 1
                 if in_degree[neighbor] == 0:
-                    queue.append(neighbor)
+                    ordered.append(neighbor)
         
-        # 4. Verifica cicli
+        # 4. Verifica cicli (confronto O(1); i nodi residui si calcolano
+        # solo in caso di errore, nell'ordine di input)
         if len(ordered) != len(nodes):
             # Ci sono cicli
-            remaining = set(node_map.keys()) - set(ordered)
+            processed = set(ordered)
+            remaining = [nid for nid in node_map if nid not in processed]
             raise CompilationError(
                 "GRAPH_CYCLE",
                 f"Il grafo contiene cicli. Nodi coinvolti: {', '.join(remaining)}"
             )
         
         # 5. Costruisci piano con risoluzione input
-        registry = get_registry()
         plan = []
         warnings = []
-        producers = _build_output_map(ordered, node_map, registry)
+        producers, outputs_by_source = _build_output_map(ordered, specs)
         
         for node_id in ordered:
             node = node_map[node_id]
             node_type = node.get("type")
             node_data = dict(node.get("data", {}))
-            
-            # Recupera specifica dal registry
-            spec = registry.get(node_type)
-            if not spec:
-                raise CompilationError(
-                    "UNKNOWN_NODE_TYPE",
-                    f"Tipo nodo sconosciuto: {node_type}",
-                    node_id
-                )
+            spec = specs[node_id]
             
             # Risolvi input automatici da edge
-            incoming_edges = [e for e in edges if e.get("target") == node_id]
+            incoming_edges = incoming_by_target.get(node_id, ())
             resolved_data = _resolve_inputs(
                 node_id, 
                 node_data, 
                 incoming_edges, 
-                producers, 
+                outputs_by_source, 
                 spec
             )
             
@@ -146,11 +163,16 @@ def compile_workflow(flow: Dict[str, Any]) -> Dict[str, Any]:
                     node_id
                 )
             
+            # Riferimenti e template pre-parsati: il runner non fa più split
+            bindings = _compile_bindings(resolved_data)
+            
             # Aggiungi al piano
             plan.append({
                 "nodeId": node_id,
                 "type": node_type,
                 "data": resolved_data,
+                "bindings": bindings,
+                "dependsOn": _collect_dependencies(node_id, incoming_edges, bindings, node_map),
                 "spec": {
                     "required": spec.required,
                     "outputs": spec.outputs
@@ -162,7 +184,7 @@ def compile_workflow(flow: Dict[str, Any]) -> Dict[str, Any]:
             "plan": plan,
             "errors": [],
             "warnings": warnings
-        }
+        }, specs
     
     except CompilationError as e:
         return {
@@ -174,7 +196,7 @@ def compile_workflow(flow: Dict[str, Any]) -> Dict[str, Any]:
                 "nodeId": e.node_id
             }],
             "warnings": []
-        }
+        }, {}
     except Exception as e:
         return {
             "ok": False,
@@ -185,35 +207,37 @@ def compile_workflow(flow: Dict[str, Any]) -> Dict[str, Any]:
                 "nodeId": None
             }],
             "warnings": []
-        }
+        }, {}
 
 
 def _build_output_map(
     ordered: List[str], 
-    node_map: Dict, 
-    registry
-) -> Dict[str, Set[str]]:
+    specs: Dict[str, NodeSpec]
+) -> Tuple[Dict[str, Set[str]], Dict[str, FrozenSet[str]]]:
     """
-    Mappa: output_name -> {node_ids che lo producono}
-    Es: {"objectId": {"n1", "n2"}}
+    Restituisce due indici:
+    - producers: output_name -> {node_ids che lo producono}
+      Es: {"objectId": {"n1", "n2"}}
+    - outputs_by_source: node_id -> frozenset(output prodotti)
+      Es: {"n1": frozenset({"objectId", "name", "path"})}
     """
-    producers = defaultdict(set)
+    producers: Dict[str, Set[str]] = {}
+    outputs_by_source: Dict[str, FrozenSet[str]] = {}
     
     for node_id in ordered:
-        node = node_map[node_id]
-        spec = registry.get(node.get("type"))
-        if spec:
-            for output in spec.outputs:
-                producers[output].add(node_id)
+        outputs = specs[node_id].outputs
+        outputs_by_source[node_id] = frozenset(outputs)
+        for output in outputs:
+            producers.setdefault(output, set()).add(node_id)
     
-    return producers
+    return producers, outputs_by_source
 
 
 def _resolve_inputs(
     node_id: str,
     node_data: Dict,
     incoming_edges: List[Dict],
-    producers: Dict[str, Set[str]],
+    outputs_by_source: Dict[str, FrozenSet[str]],
     spec
 ) -> Dict:
     """
@@ -233,7 +257,7 @@ def _resolve_inputs(
             source_id = edge.get("source")
             
             # Il source produce questo field?
-            if source_id in producers.get(required_field, set()):
+            if required_field in outputs_by_source.get(source_id, _NO_OUTPUTS):
                 # Auto-wire con reference simbolica
                 resolved[required_field] = f"$from:{source_id}:$output:{required_field}"
                 break
@@ -241,6 +265,51 @@ def _resolve_inputs(
     return resolved
 
 
+def _compile_bindings(data: Dict) -> Dict[str, Tuple]:
+    """
+    Pre-parsa i valori di data che il runner deve risolvere a ogni esecuzione.
+    I valori letterali non compaiono; le altre chiavi diventano tuple taggate:
+    
+    "$from:n1:$output:objectId" -> ("$ref", "n1", "objectId")
+    "Snd_${timestamp}"          -> ("$tmpl", "Snd_${timestamp}", "${timestamp}")
+    "$from:malformato"          -> ("$invalid", "$from:malformato")
+    """
+    bindings = {}
+    for key, value in data.items():
+        if not isinstance(value, str):
+            continue
+        if value.startswith("$from:"):
+            parts = value.split(":")
+            if len(parts) != 4 or parts[2] != "$output":
+                bindings[key] = ("$invalid", value)
+            else:
+                bindings[key] = ("$ref", parts[1], parts[3])
+        elif "${timestamp}" in value:
+            bindings[key] = ("$tmpl", value, "${timestamp}")
+        elif "${HHmmss}" in value:
+            bindings[key] = ("$tmpl", value, "${HHmmss}")
+    return bindings
+
+
+def _collect_dependencies(
+    node_id: str,
+    incoming_edges: List[Dict],
+    bindings: Dict[str, Tuple],
+    node_map: Dict[str, Any]
+) -> List[str]:
+    """
+    Nodi da cui node_id dipende: source degli edge entranti più i nodi
+    citati nei riferimenti $from:nodeId:$output:field (anche senza edge).
+    """
+    deps = [edge["source"] for edge in incoming_edges]
+    for binding in bindings.values():
+        if binding[0] == "$ref":
+            source_id = binding[1]
+            if source_id in node_map and source_id != node_id:
+                deps.append(source_id)
+    return list(dict.fromkeys(deps))
+
+
 def _suggest_connections(
     missing_fields: List[str],
     producers: Dict[str, Set[str]],
@@ -259,39 +328,60 @@ def _suggest_connections(
     return list(suggestions)
 
 
-def validate_workflow(flow: Dict[str, Any]) -> Dict[str, Any]:
+def _file_exists(path: str) -> bool:
+    try:
+        os.stat(path)
+        return True
+    except (OSError, ValueError):
+        return False
+
+
+def validate_workflow(
+    flow: Dict[str, Any],
+    *,
+    precompiled: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
     """
     Wrapper di compile_workflow per validazione pre-flight.
     Aggiunge controlli semantici (file esistono, etc).
+    
+    precompiled: risultato di compile_workflow(flow) già disponibile
+    (es. compile → validate → execute); evita di ricompilare.
     """
-    compilation = compile_workflow(flow)
+    compilation = precompiled if precompiled is not None else compile_workflow(flow)
     
     if not compilation["ok"]:
         return compilation
     
     # Controlli semantici aggiuntivi
-    import os
     semantic_errors = []
     
-    for step in compilation["plan"]:
-        node_id = step["nodeId"]
-        node_type = step["type"]
-        data = step["data"]
-        
-        # Verifica esistenza file per audioImport
-        if node_type == "audioImport":
-            filepath = data.get("filePath", "")
-            # Skip riferimenti simbolici
-            if not filepath.startswith("$from:") and filepath:
-                if not os.path.exists(filepath):
-                    semantic_errors.append({
-                        "code": "FILE_NOT_FOUND",
-                        "message": f"File non trovato: {filepath}",
-                        "nodeId": node_id
-                    })
-        
-        # TODO: verifica parent esistono in Wwise (richiede query WAAPI)
-        # TODO: verifica bus path validi
+    # Verifica esistenza file per audioImport: un solo stat per path,
+    # eseguiti in parallelo (utile su storage lento / share di rete)
+    audio_files = [
+        (step["nodeId"], step["data"].get("filePath", ""))
+        for step in compilation["plan"]
+        if step["type"] == "audioImport"
+    ]
+    # Skip riferimenti simbolici
+    audio_files = [(nid, fp) for nid, fp in audio_files if fp and not fp.startswith("$from:")]
+    paths = list(dict.fromkeys(fp for _, fp in audio_files))
+    if len(paths) > 1:
+        with ThreadPoolExecutor(max_workers=min(_STAT_WORKERS, len(paths))) as executor:
+            file_exists = dict(zip(paths, executor.map(_file_exists, paths)))
+    else:
+        file_exists = {fp: _file_exists(fp) for fp in paths}
+    
+    for node_id, filepath in audio_files:
+        if not file_exists[filepath]:
+            semantic_errors.append({
+                "code": "FILE_NOT_FOUND",
+                "message": f"File non trovato: {filepath}",
+                "nodeId": node_id
+            })
+    
+    # TODO: verifica parent esistono in Wwise (richiede query WAAPI)
+    # TODO: verifica bus path validi
     
     if semantic_errors:
         return {
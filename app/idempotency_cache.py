@@ -0,0 +1,77 @@
+"""
+Cache di idempotenza per il runner V2: idem_key -> result del nodo.
+
+Backend disponibili:
+- InMemoryCache: dict di processo (default, vive quanto la singola esecuzione)
+- SQLiteCache: file SQLite in WAL, persiste tra esecuzioni e riavvii
+
+Qualsiasi oggetto con get/set compatibili (es. Redis) può essere passato
+a execute_workflow_v2(cache=...). Il runner chiama get/set dai thread
+worker: i backend devono essere thread-safe.
+Il server FastAPI usa SQLiteCache se è impostata la variabile d'ambiente
+WWISEFLOW_IDEM_CACHE (path del file), altrimenti InMemoryCache per run.
+"""
+import sqlite3
+import threading
+from typing import Dict, Any, Optional, Protocol
+import orjson
+
+
+class CacheBackend(Protocol):
+    """Contratto minimo di una cache di idempotenza"""
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Risultato memorizzato per key, None se assente"""
+        ...
+
+    def set(self, key: str, value: Dict[str, Any]) -> None:
+        """Memorizza il risultato di un nodo"""
+        ...
+
+
+class InMemoryCache:
+    """Cache in memoria: equivale al vecchio dict memo del runner"""
+
+    def __init__(self):
+        self._data: Dict[str, Dict[str, Any]] = {}
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        return self._data.get(key)
+
+    def set(self, key: str, value: Dict[str, Any]) -> None:
+        self._data[key] = value
+
+
+class SQLiteCache:
+    """
+    Cache persistente su SQLite: una tabella idem(key, result) con il
+    result serializzato in JSON (orjson). La connessione è condivisa tra
+    thread e serializzata da un lock.
+    WAL + synchronous=NORMAL: il commit di ogni set non fa fsync; un crash
+    del sistema può perdere solo le ultime voci (il nodo verrà rieseguito).
+    """
+
+    def __init__(self, path: str = "wwiseflow_idem.sqlite3"):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS idem (key TEXT PRIMARY KEY, result BLOB NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT result FROM idem WHERE key = ?", (key,)).fetchone()
+        return orjson.loads(row[0]) if row else None
+
+    def set(self, key: str, value: Dict[str, Any]) -> None:
+        blob = orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS)
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO idem (key, result) VALUES (?, ?)", (key, blob))
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
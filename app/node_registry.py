@@ -6,8 +6,10 @@ Ogni nodo dichiara:
 - outputs: cosa esporta nel contesto (es. objectId)
 - run: funzione di esecuzione che usa il CommandBus
 """
-from typing import Dict, Any, List, Optional, Callable
-from dataclasses import dataclass
+from operator import attrgetter, itemgetter
+from typing import Dict, Any, List, Optional, Callable, Tuple
+from dataclasses import dataclass, field
+from .command_bus import CommandBus
 
 
 @dataclass
@@ -16,11 +18,90 @@ class NodeSpec:
     type: str
     label: str  # Nome leggibile per UI
     description: str
-    required: List[str]  # Input obbligatori
+    required: Tuple[str, ...]  # Input obbligatori
     optional: Dict[str, Any]  # Input opzionali con default
-    outputs: List[str]  # Output esportati nel contesto
+    outputs: Tuple[str, ...]  # Output esportati nel contesto
     run: Callable  # Funzione di esecuzione
     category: str = "wwise"  # Per raggruppare in UI
+    # False: il nodo viene sempre eseguito e il risultato non va in cache
+    # di idempotenza (effetti collaterali come il salvataggio, o letture
+    # che dipendono dallo stato del progetto e non dagli input)
+    cacheable: bool = True
+    # Estrattori (output, fn) precalcolati per result dict / oggetti, usati
+    # dal runner per esportare gli output nel contesto (derivati da outputs)
+    item_extractors: Tuple[Tuple[str, Callable], ...] = field(default=(), init=False, repr=False, compare=False)
+    attr_extractors: Tuple[Tuple[str, Callable], ...] = field(default=(), init=False, repr=False, compare=False)
+    
+    def __post_init__(self):
+        # Congela required/outputs: la spec non cambia dopo la registrazione
+        self.required = tuple(self.required)
+        self.outputs = tuple(self.outputs)
+        self.item_extractors = tuple((name, _item_extractor(name)) for name in self.outputs)
+        self.attr_extractors = tuple((name, _attr_extractor(name)) for name in self.outputs)
+
+
+def _item_extractor(name: str) -> Callable:
+    """Estrattore per result dict; objectId viene preso da "id" se presente"""
+    if name != "objectId":
+        return itemgetter(name)
+    
+    def get_object_id(d: Dict) -> Any:
+        return d["id"] if "id" in d else d["objectId"]
+    return get_object_id
+
+
+def _attr_extractor(name: str) -> Callable:
+    """Estrattore per result oggetto; objectId viene preso da .id se presente"""
+    if name != "objectId":
+        return attrgetter(name)
+    
+    def get_object_id(obj: Any) -> Any:
+        try:
+            return obj.id
+        except AttributeError:
+            return obj.objectId
+    return get_object_id
+
+
+# ============================================
+# RUN DEI NODI BUILT-IN
+# ============================================
+
+def run_create_sound(data: Dict, bus: CommandBus) -> Dict:
+    """Crea un oggetto Sound in Wwise"""
+    return bus.create_sound(data)
+
+
+def run_audio_import(data: Dict, bus: CommandBus) -> Dict:
+    """Importa file audio in un Sound"""
+    return bus.audio_import(data)
+
+
+def run_set_reference(data: Dict, bus: CommandBus) -> Dict:
+    """Imposta reference OutputBus"""
+    # Normalizza per il bus
+    payload = {
+        "objectId": data.get("objectId"),
+        "busPath": data.get("valuePath")
+    }
+    return bus.set_output_bus(payload)
+
+
+def run_project_save(data: Dict, bus: CommandBus) -> Dict:
+    """Salva il progetto Wwise"""
+    return bus.project_save({})
+
+
+def run_query_waql(data: Dict, bus: CommandBus) -> Dict:
+    """Esegue query WAQL"""
+    # TODO: implementare nel bus
+    return {"ok": False, "error": "WAQL non ancora implementato"}
+
+
+def run_set_property(data: Dict, bus: CommandBus) -> Dict:
+    """Imposta proprietà generica"""
+    # TODO: implementare nel bus
+    return {"ok": False, "error": "setProperty non ancora implementato"}
 
 
 class NodeRegistry:
@@ -28,6 +109,10 @@ class NodeRegistry:
     
     def __init__(self):
         self._nodes: Dict[str, NodeSpec] = {}
+        # Scorciatoia per il percorso caldo: registry.get chiama direttamente
+        # dict.get senza passare dal metodo Python. _nodes non viene mai
+        # riassegnato, quindi il bound method vede anche le registrazioni future.
+        self.get = self._nodes.get
         self._register_builtin_nodes()
     
     def register(self, spec: NodeSpec):
@@ -64,7 +149,8 @@ class NodeRegistry:
         
         # Verifica campi obbligatori
         for field in spec.required:
-            if field not in data or data[field] is None or data[field] == "":
+            value = data.get(field)
+            if value is None or value == "":
                 missing.append(field)
                 errors.append(f"Campo obbligatorio mancante: {field}")
         
@@ -76,17 +162,9 @@ class NodeRegistry:
     
     def _register_builtin_nodes(self):
         """Registra i nodi built-in di Wwise"""
-        from .command_bus import CommandBus
-        
-        bus = CommandBus()
-        
         # ============================================
         # CREATE SOUND
         # ============================================
-        def run_create_sound(data: Dict, bus: CommandBus) -> Dict:
-            """Crea un oggetto Sound in Wwise"""
-            return bus.create_sound(data)
-        
         self.register(NodeSpec(
             type="createSound",
             label="Create Sound",
@@ -103,10 +181,6 @@ class NodeRegistry:
         # ============================================
         # AUDIO IMPORT
         # ============================================
-        def run_audio_import(data: Dict, bus: CommandBus) -> Dict:
-            """Importa file audio in un Sound"""
-            return bus.audio_import(data)
-        
         self.register(NodeSpec(
             type="audioImport",
             label="Audio Import",
@@ -121,15 +195,6 @@ class NodeRegistry:
         # ============================================
         # SET REFERENCE (OutputBus)
         # ============================================
-        def run_set_reference(data: Dict, bus: CommandBus) -> Dict:
-            """Imposta reference OutputBus"""
-            # Normalizza per il bus
-            payload = {
-                "objectId": data.get("objectId"),
-                "busPath": data.get("valuePath")
-            }
-            return bus.set_output_bus(payload)
-        
         self.register(NodeSpec(
             type="setReference",
             label="Set Output Bus",
@@ -144,10 +209,6 @@ class NodeRegistry:
         # ============================================
         # PROJECT SAVE
         # ============================================
-        def run_project_save(data: Dict, bus: CommandBus) -> Dict:
-            """Salva il progetto Wwise"""
-            return bus.project_save({})
-        
         self.register(NodeSpec(
             type="projectSave",
             label="Save Project",
@@ -156,17 +217,13 @@ class NodeRegistry:
             optional={},
             outputs=["saved"],
             run=run_project_save,
-            category="wwise.project"
+            category="wwise.project",
+            cacheable=False
         ))
         
         # ============================================
         # QUERY WAQL (TODO)
         # ============================================
-        def run_query_waql(data: Dict, bus: CommandBus) -> Dict:
-            """Esegue query WAQL"""
-            # TODO: implementare nel bus
-            return {"ok": False, "error": "WAQL non ancora implementato"}
-        
         self.register(NodeSpec(
             type="queryWAQL",
             label="Query WAQL",
@@ -175,17 +232,13 @@ class NodeRegistry:
             optional={"returns": ["id", "name", "type"]},
             outputs=["results"],
             run=run_query_waql,
-            category="wwise.query"
+            category="wwise.query",
+            cacheable=False
         ))
         
         # ============================================
         # SET PROPERTY (TODO)
         # ============================================
-        def run_set_property(data: Dict, bus: CommandBus) -> Dict:
-            """Imposta proprietà generica"""
-            # TODO: implementare nel bus
-            return {"ok": False, "error": "setProperty non ancora implementato"}
-        
         self.register(NodeSpec(
             type="setProperty",
             label="Set Property",
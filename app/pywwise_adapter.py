@@ -3,8 +3,11 @@
 Thin adapter around PyWwise to keep WAAPI usage in one place.
 Uses positional signatures expected by PyWwise.
 """
-from typing import Optional, Dict, Any
+import asyncio
+import threading
+from typing import Optional, Dict, Any, List
 from dataclasses import dataclass
+from functools import lru_cache
 from pywwise import (
     new_waapi_connection,
     ProjectPath,
@@ -15,11 +18,97 @@ from pywwise import (
     ESampleRate,
 )
 
+# Errori di trasporto (connessione WAAPI caduta o irraggiungibile): solo
+# questi giustificano un nuovo tentativo su una connessione nuova
+_TRANSPORT_ERRORS: tuple = (ConnectionError, TimeoutError)
+try:
+    from waapi import CannotConnectToWaapiException
+    _TRANSPORT_ERRORS += (CannotConnectToWaapiException,)
+except ImportError:
+    pass
+try:
+    from autobahn.wamp.exception import TransportLost
+    _TRANSPORT_ERRORS += (TransportLost,)
+except ImportError:
+    pass
+
+# code dei WwiseResult falliti per errore di trasporto
+TRANSPORT_ERROR = "WAAPI_TRANSPORT_ERROR"
+
+# Un event loop per thread, riusato da tutti i PyWwiseAgent di quel thread
+_tls = threading.local()
+
+def _ensure_thread_loop():
+    try:
+        asyncio.get_running_loop()
+        return  # il thread ha già un loop attivo (es. server async): lo uso
+    except RuntimeError:
+        pass
+    loop = getattr(_tls, "loop", None)
+    if loop is None or loop.is_closed():
+        loop = asyncio.new_event_loop()
+        _tls.loop = loop
+    asyncio.set_event_loop(loop)
+
+@lru_cache(maxsize=512)
+def _project_path(path: str) -> ProjectPath:
+    # ProjectPath non viene mai modificato dopo la costruzione: riuso sicuro
+    return ProjectPath(path)
+
 @dataclass
 class WwiseResult:
     ok: bool
-    data: Optional[Dict[str, Any]] = None
+    data: Optional[Any] = None
     error: Optional[str] = None
+    code: Optional[str] = None
+
+def _failure(e: Exception) -> WwiseResult:
+    """
+    WwiseResult di errore: i problemi di trasporto hanno code TRANSPORT_ERROR,
+    gli errori logici WAAPI (parent inesistente, ecc.) restano senza code
+    """
+    code = TRANSPORT_ERROR if isinstance(e, _TRANSPORT_ERRORS) else None
+    return WwiseResult(ok=False, error=str(e), code=code)
+
+def _guid_key(guid: Any) -> str:
+    """GUID confrontabile: senza graffe, minuscolo"""
+    return str(guid).strip("{}").lower()
+
+def _map_import_response(items: List[Dict[str, str]], response: Any) -> List[Dict[str, Any]]:
+    """
+    Riporta su ogni item l'esito di ak.wwise.core.audio.import, che non
+    fallisce per i singoli file: la risposta elenca gli oggetti importati
+    (dict WAAPI {"objects", "log"} oppure tuple di WwiseObjectInfo).
+    Un item è fallito se il log ha un errore che cita il suo file, oppure
+    se il suo oggetto non compare tra quelli restituiti.
+    """
+    if isinstance(response, dict):
+        objects = response.get("objects")
+        log = response.get("log") or ()
+    else:
+        objects, log = response, ()
+    imported = None
+    if objects is not None:
+        imported = {
+            _guid_key(obj.get("id") if isinstance(obj, dict) else getattr(obj, "guid", getattr(obj, "id", None)))
+            for obj in objects
+        }
+    errors = [
+        str(entry.get("message", ""))
+        for entry in log
+        if isinstance(entry, dict) and entry.get("severity") == "Error"
+    ]
+    
+    mapped = []
+    for item in items:
+        entry: Dict[str, Any] = {"object": item["objectId"], "file": item["filePath"]}
+        messages = [message for message in errors if item["filePath"] in message]
+        if messages:
+            entry["error"] = "; ".join(messages)
+        elif imported is not None and _guid_key(item["objectId"]) not in imported:
+            entry["error"] = f"Import non riuscito: {item['filePath']}"
+        mapped.append(entry)
+    return mapped
 
 class PyWwiseAgent:
     def __init__(self):
@@ -28,12 +117,7 @@ class PyWwiseAgent:
     def connect(self):
         if self._conn is None:
             # Garantisco un event loop nel thread corrente (necessario in threadpool)
-            import asyncio
-            try:
-                asyncio.get_event_loop()
-            except RuntimeError:
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
+            _ensure_thread_loop()
             # ora posso creare la connessione WAAPI in sicurezza
             self._conn = new_waapi_connection()
         return self
@@ -63,7 +147,7 @@ class PyWwiseAgent:
 
     def create_sound(self, name: str, parent_path: Optional[str] = None) -> WwiseResult:
         try:
-            parent = ProjectPath(parent_path) if parent_path else self.ensure_default_parent()
+            parent = _project_path(parent_path) if parent_path else self.ensure_default_parent()
             info = self.ak.wwise.core.object.create(
                 name,
                 EObjectType.SOUND,
@@ -72,7 +156,7 @@ class PyWwiseAgent:
             )
             return WwiseResult(ok=True, data=info)
         except Exception as e:
-            return WwiseResult(ok=False, error=str(e))
+            return _failure(e)
 
         # Not used here, but handy for quick file gen
     
@@ -84,11 +168,11 @@ class PyWwiseAgent:
             self.ak.wwise.core.object.set_reference(
                 object=object_id,
                 reference="OutputBus",
-                value=ProjectPath(bus_path),
+                value=_project_path(bus_path),
             )
             return WwiseResult(ok=True, data={"object": object_id, "bus": bus_path})
         except Exception as e:
-            return WwiseResult(ok=False, error=str(e))
+            return _failure(e)
 
     def audio_import(self, object_id: str, wav_path: str, language: str = "SFX") -> WwiseResult:
         try:
@@ -99,11 +183,41 @@ class PyWwiseAgent:
             )
             return WwiseResult(ok=True, data={"object": object_id, "file": wav_path})
         except Exception as e:
-            return WwiseResult(ok=False, error=str(e))
+            return _failure(e)
+
+    def audio_import_batch(self, items: List[Dict[str, str]]) -> WwiseResult:
+        """
+        Importa più file con una sola chiamata WAAPI.
+        items: [{"objectId": ..., "filePath": ..., "language": ...}, ...]
+        data: un dict per item, nello stesso ordine; gli import falliti
+        dentro il batch hanno "error" (vedi _map_import_response).
+        """
+        try:
+            response = self.ak.wwise.core.audio.import_(
+                default={"importLanguage": items[0].get("language", "SFX"), "originalsSubFolder": ""},
+                imports=[
+                    {
+                        "audioFile": item["filePath"],
+                        "objectPath": f"id:{item['objectId']}",
+                        "importLanguage": item.get("language", "SFX"),
+                    }
+                    for item in items
+                ],
+                importOperation="useExisting",
+            )
+        except Exception as e:
+            return _failure(e)
+        return WwiseResult(ok=True, data=_map_import_response(items, response))
+
+    def get_info(self) -> WwiseResult:
+        try:
+            return WwiseResult(ok=True, data=self.ak.wwise.core.get_info())
+        except Exception as e:
+            return _failure(e)
 
     def project_save(self) -> WwiseResult:
         try:
             self.ak.wwise.core.project.save()
             return WwiseResult(ok=True, data={"saved": True})
         except Exception as e:
-            return WwiseResult(ok=False, error=str(e))
+            return _failure(e)
@@ -9,7 +9,8 @@ Nodi supportati:
   - setReference { objectId? | sourceNode, reference='OutputBus', valuePath }
   - projectSave {}
 """
-from typing import Dict, Any, List
+from collections import deque
+from typing import Dict, Any, List, Callable
 from .command_bus import CommandBus
 
 def _extract_id_from_data(data: Any) -> str | None:
@@ -20,89 +21,119 @@ def _extract_id_from_data(data: Any) -> str | None:
         return data.get("id")
     return getattr(data, "id", None)
 
+def _fail(results: List[Dict[str, Any]], node_id: str, code: str, msg: str) -> str:
+    """Registra l'errore e restituisce il nodo su cui fermarsi"""
+    results.append({"node": node_id, "ok": False, "code": code, "error": msg})
+    return node_id
+
+def _ensure_object_id(data: Dict[str, Any], ctx: Dict[str, Dict[str, str]]) -> str | None:
+    """Recupera un objectId da data o da sourceNode"""
+    if "objectId" in data and data["objectId"]:
+        return data["objectId"]
+    src = data.get("sourceNode")
+    if not src:
+        return None
+    ref = ctx.get(src)
+    if not ref:
+        return None
+    return ref.get("objectId")
+
+# ============================================
+# HANDLER PER TIPO DI NODO
+# Firma comune: (bus, nid, data, ctx, results, pending) -> nodo di stop | None
+# pending: nodi ancora da eseguire (un handler può consumarne in anticipo)
+# ============================================
+
+def _h_create_sound(bus, nid, data, ctx, results, pending) -> str | None:
+    res = bus.create_sound(data)
+    results.append({"node": nid, "result": res})
+    if not res.get("ok"):
+        return _fail(results, nid, res.get("code", "STEP_FAILED"), res.get("error", "createSound fallita"))
+    oid = _extract_id_from_data(res.get("data"))
+    if not oid:
+        return _fail(results, nid, "MISSING_ID", "createSound: nessun id ritornato dal backend")
+    ctx[nid] = {"objectId": oid}
+    return None
+
+def _h_audio_import(bus, nid, data, ctx, results, pending) -> str | None:
+    obj = _ensure_object_id(data, ctx)
+    if not obj:
+        return _fail(results, nid, "MISSING_DEPENDENCY", "audioImport richiede objectId o sourceNode valido")
+    data = {**data, "objectId": obj}
+
+    # Raccoglie gli audioImport contigui già risolvibili
+    # per importarli con una sola chiamata WAAPI
+    batch = [(nid, data)]
+    while pending and pending[0].get("type") == "audioImport" and pending[0].get("id"):
+        next_data = pending[0].get("data") or {}
+        next_obj = _ensure_object_id(next_data, ctx)
+        if not next_obj or not next_data.get("filePath"):
+            break
+        batch.append((pending.popleft()["id"], {**next_data, "objectId": next_obj}))
+
+    if len(batch) == 1:
+        responses = [bus.audio_import(data)]
+    else:
+        responses = bus.audio_import_batch([d for _, d in batch])
+
+    for (batch_nid, _), res in zip(batch, responses):
+        results.append({"node": batch_nid, "result": res})
+        if not res.get("ok"):
+            return _fail(results, batch_nid, res.get("code", "STEP_FAILED"), res.get("error", "audioImport fallita"))
+    return None
+
+def _h_set_reference(bus, nid, data, ctx, results, pending) -> str | None:
+    if data.get("reference") != "OutputBus":
+        return _fail(results, nid, "UNSUPPORTED_REFERENCE", "Solo OutputBus è supportato in questo sample")
+    obj = _ensure_object_id(data, ctx)
+    if not obj:
+        return _fail(results, nid, "MISSING_DEPENDENCY", "setReference richiede objectId o sourceNode valido")
+    res = bus.set_output_bus({"objectId": obj, "busPath": data.get("valuePath")})
+    results.append({"node": nid, "result": res})
+    if not res.get("ok"):
+        return _fail(results, nid, res.get("code", "STEP_FAILED"), res.get("error", "setReference fallita"))
+    return None
+
+def _h_project_save(bus, nid, data, ctx, results, pending) -> str | None:
+    res = bus.project_save({})
+    results.append({"node": nid, "result": res})
+    if not res.get("ok"):
+        return _fail(results, nid, res.get("code", "STEP_FAILED"), res.get("error", "projectSave fallita"))
+    return None
+
+_HANDLERS: Dict[str, Callable[..., str | None]] = {
+    "createSound": _h_create_sound,
+    "audioImport": _h_audio_import,
+    "setReference": _h_set_reference,
+    "projectSave": _h_project_save,
+}
+
 def execute_workflow(flow: Dict[str, Any], dry_run: bool = False) -> Dict[str, Any]:
-    bus = CommandBus()
-    ctx: Dict[str, Dict[str, str]] = {}   # nodeId -> {"objectId": "..."}
-    results: List[Dict[str, Any]] = []
-    nodes = flow.get("nodes", [])
-
-    def fail(node_id: str, code: str, msg: str):
-        results.append({"node": node_id, "ok": False, "code": code, "error": msg})
-
-    for node in nodes:
-        nid = node.get("id")
-        ntype = node.get("type")
-        data = dict(node.get("data", {}))  # copia difensiva
-
-        if not nid or not ntype:
-            results.append({"node": nid or "<unknown>", "ok": False, "code": "INVALID_NODE", "error": "Nodo senza id o type"})
-            continue
-
-        if dry_run:
-            results.append({"node": nid, "ok": True, "dryRun": True, "type": ntype, "data": data})
-            continue
-
-        # helper per recuperare un objectId da data o da sourceNode
-        def ensure_object_id() -> str | None:
-            if "objectId" in data and data["objectId"]:
-                return data["objectId"]
-            src = data.get("sourceNode")
-            if not src:
-                return None
-            ref = ctx.get(src)
-            if not ref:
-                return None
-            return ref.get("objectId")
-
-        if ntype == "createSound":
-            res = bus.create_sound(data)
-            results.append({"node": nid, "result": res})
-            if res.get("ok"):
-                oid = _extract_id_from_data(res.get("data"))
-                if oid:
-                    ctx[nid] = {"objectId": oid}
-                else:
-                    fail(nid, "MISSING_ID", "createSound: nessun id ritornato dal backend")
-                    return {"ok": False, "stopped": True, "stopAt": nid, "results": results}
+    with CommandBus() as bus:
+        ctx: Dict[str, Dict[str, str]] = {}   # nodeId -> {"objectId": "..."}
+        results: List[Dict[str, Any]] = []
+        pending = deque(flow.get("nodes", []))
+
+        while pending:
+            node = pending.popleft()
+            nid = node.get("id")
+            ntype = node.get("type")
+            data = node.get("data") or {}  # sola lettura: gli handler copiano prima di modificare
+
+            if not nid or not ntype:
+                results.append({"node": nid or "<unknown>", "ok": False, "code": "INVALID_NODE", "error": "Nodo senza id o type"})
+                continue
+
+            if dry_run:
+                results.append({"node": nid, "ok": True, "dryRun": True, "type": ntype, "data": data})
+                continue
+
+            handler = _HANDLERS.get(ntype)
+            if handler is None:
+                stop_at = _fail(results, nid, "UNKNOWN_NODE", f"Tipo nodo non supportato: {ntype}")
             else:
-                fail(nid, res.get("code", "STEP_FAILED"), res.get("error", "createSound fallita"))
-                return {"ok": False, "stopped": True, "stopAt": nid, "results": results}
-
-        elif ntype == "audioImport":
-            obj = ensure_object_id()
-            if not obj:
-                fail(nid, "MISSING_DEPENDENCY", "audioImport richiede objectId o sourceNode valido")
-                return {"ok": False, "stopped": True, "stopAt": nid, "results": results}
-            data["objectId"] = obj
-            res = bus.audio_import(data)
-            results.append({"node": nid, "result": res})
-            if not res.get("ok"):
-                fail(nid, res.get("code", "STEP_FAILED"), res.get("error", "audioImport fallita"))
-                return {"ok": False, "stopped": True, "stopAt": nid, "results": results}
-
-        elif ntype == "setReference":
-            if data.get("reference") != "OutputBus":
-                fail(nid, "UNSUPPORTED_REFERENCE", "Solo OutputBus è supportato in questo sample")
-                return {"ok": False, "stopped": True, "stopAt": nid, "results": results}
-            obj = ensure_object_id()
-            if not obj:
-                fail(nid, "MISSING_DEPENDENCY", "setReference richiede objectId o sourceNode valido")
-                return {"ok": False, "stopped": True, "stopAt": nid, "results": results}
-            res = bus.set_output_bus({"objectId": obj, "busPath": data.get("valuePath")})
-            results.append({"node": nid, "result": res})
-            if not res.get("ok"):
-                fail(nid, res.get("code", "STEP_FAILED"), res.get("error", "setReference fallita"))
-                return {"ok": False, "stopped": True, "stopAt": nid, "results": results}
-
-        elif ntype == "projectSave":
-            res = bus.project_save({})
-            results.append({"node": nid, "result": res})
-            if not res.get("ok"):
-                fail(nid, res.get("code", "STEP_FAILED"), res.get("error", "projectSave fallita"))
-                return {"ok": False, "stopped": True, "stopAt": nid, "results": results}
-
-        else:
-            fail(nid, "UNKNOWN_NODE", f"Tipo nodo non supportato: {ntype}")
-            return {"ok": False, "stopped": True, "stopAt": nid, "results": results}
-
-    return {"ok": True, "results": results}
\ No newline at end of file
+                stop_at = handler(bus, nid, data, ctx, results, pending)
+            if stop_at:
+                return {"ok": False, "stopped": True, "stopAt": stop_at, "results": results}
+
+        return {"ok": True, "results": results}
@@ -4,46 +4,142 @@ Workflow Runner V2: esegue piano compilato con idempotenza e risoluzione simboli
 Features:
 - Risolve $from:nodeId:$output:field da contesto
 - Idempotenza: salta step già eseguiti con stessi input
+- Esegue in parallelo i nodi indipendenti (livelli del DAG)
 - Interrompe al primo errore
 - Supporta dry_run per anteprima
 - Esporta chiavi di idempotenza nei risultati
 """
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Set, Tuple, Callable, NamedTuple, Awaitable
+from functools import partial
+import asyncio
 import hashlib
-import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from graphlib import TopologicalSorter, CycleError
+import orjson
 from .command_bus import CommandBus
-from .graph_compiler import compile_workflow
-from .node_registry import get_registry
+from .graph_compiler import CompilationError, compile_workflow_with_specs
+from .idempotency_cache import CacheBackend, InMemoryCache
+from .node_registry import NodeSpec, get_registry
 
 
-def execute_workflow_v2(
+class StepExec(NamedTuple):
+    """Step del piano pre-compilato: niente lookup su dict/registry a runtime"""
+    index: int  # posizione nel piano (e nei risultati)
+    node_id: str
+    node_type: str
+    depends_on: List[str]
+    resolve: Callable[..., Dict]  # (context, exported, stamps) -> data risolti
+    run: Callable[[Dict, CommandBus], Dict]
+    extractors: Tuple[Tuple, Tuple]  # estrattori output della spec: (result dict, result oggetto)
+    cacheable: bool  # spec.cacheable: False -> niente chiave né cache
+
+
+def compile_plan_to_callables(
+    plan: List[Dict],
+    specs: Optional[Dict[str, NodeSpec]] = None
+) -> List[StepExec]:
+    """
+    Converte il piano di compile_workflow in StepExec, una volta per run:
+    resolver con data/bindings già legati e spec.run già risolta.
+    Gli step senza binding restituiscono data per riferimento, senza copia:
+    a valle data viene solo letto.
+    
+    specs: NodeSpec per nodeId da compile_workflow_with_specs; senza (piano
+    compilato altrove) le spec vengono cercate nel registry.
+    Solleva CompilationError UNKNOWN_NODE_TYPE se un tipo non ha spec.
+    """
+    if specs is None:
+        registry = get_registry()
+        specs = {step["nodeId"]: registry.get(step["type"]) for step in plan}
+    compiled = []
+    for index, step in enumerate(plan):
+        spec = specs.get(step["nodeId"])
+        if spec is None:
+            raise CompilationError(
+                "UNKNOWN_NODE_TYPE",
+                f"Tipo nodo sconosciuto: {step['type']}",
+                step["nodeId"]
+            )
+        compiled.append(StepExec(
+            index=index,
+            node_id=step["nodeId"],
+            node_type=step["type"],
+            depends_on=step["dependsOn"],
+            resolve=(
+                partial(_resolve_symbolic_refs, step["data"], step["bindings"])
+                if step["bindings"] else partial(_literal_data, step["data"])
+            ),
+            run=spec.run,
+            extractors=(spec.item_extractors, spec.attr_extractors),
+            cacheable=spec.cacheable
+        ))
+    return compiled
+
+
+async def execute_workflow_v2(
     flow: Dict[str, Any],
     dry_run: bool = False,
     resume_from: Optional[str] = None,
-    force_rerun: bool = False
+    force_rerun: bool = False,
+    max_concurrency: int = 8,
+    cache: Optional[CacheBackend] = None,
+    on_event: Optional[Callable[[Dict], Awaitable[None]]] = None,
+    precompiled: Optional[Dict[str, Any]] = None,
+    specs: Optional[Dict[str, NodeSpec]] = None,
+    verbose: bool = False
 ) -> Dict[str, Any]:
     """
     Esegue workflow compilato con gestione avanzata.
     
+    I nodi vengono raggruppati in livelli con graphlib.TopologicalSorter
+    (dipendenze = step["dependsOn"]): i nodi pronti nello stesso momento
+    sono indipendenti e vengono eseguiti in parallelo con asyncio.gather.
+    Le chiamate WAAPI sono bloccanti e girano in un ThreadPoolExecutor
+    dedicato alla run (max_concurrency thread), con un CommandBus (quindi
+    una connessione) per thread worker: al massimo max_concurrency
+    connessioni WAAPI per run.
+    Anche compilazione, hashing (executionId, chiavi di idempotenza) e
+    get/set sulla cache girano in thread: il loop resta libero per le altre
+    richieste anche con backend su disco (SQLiteCache).
+    
     Args:
         flow: Workflow React Flow format
         dry_run: Se True, restituisce piano senza eseguire
         resume_from: Riprendi da questo nodeId (skip precedenti)
-        force_rerun: Forza riesecuzione anche se idempotente
+        force_rerun: Forza riesecuzione anche se idempotente (senza calcolare
+            chiavi: i risultati non hanno idemKey e non vanno in cache)
+        max_concurrency: Massimo numero di nodi eseguiti in contemporanea
+        cache: Cache di idempotenza (es. SQLiteCache per saltare i nodi già
+            eseguiti in run precedenti); default InMemoryCache per questa run.
+            Le chiavi includono l'impronta del flow: flow diversi con gli
+            stessi nodeId non condividono voci. I nodi con spec.cacheable
+            False (es. projectSave) vengono sempre eseguiti
+        on_event: Callback async per lo streaming (es. WebSocket), riceve
+            {"type": "node_start", ...} e {"type": "node_complete", ...}
+        precompiled: Risultato di compile_workflow(flow) già disponibile;
+            evita di ricompilare
+        specs: NodeSpec di precompiled (da compile_workflow_with_specs);
+            evita il lookup nel registry per ogni step
+        verbose: Se True, ogni risultato riporta anche i data risolti usati
     
     Returns:
         {
             ok: bool,
-            results: List[Dict],  # Risultati per nodo
+            results: List[Dict],  # Risultati per nodo (in ordine di piano)
             stopped: bool,
             stopAt: str,
             executionId: str,
             timestamp: str
         }
     """
-    # 1. Compila workflow
-    compilation = compile_workflow(flow)
+    # 1. Compila workflow (CPU-bound, fuori dal loop: piani grandi
+    # bloccherebbero le altre richieste e i WebSocket)
+    if precompiled is not None:
+        compilation = precompiled
+    else:
+        compilation, specs = await asyncio.to_thread(compile_workflow_with_specs, flow)
     
     if not compilation["ok"]:
         return {
@@ -56,8 +152,9 @@ def execute_workflow_v2(
     
     plan = compilation["plan"]
     
-    # Genera execution ID unico
-    execution_id = _generate_execution_id(flow)
+    # Impronta del flow: scope delle chiavi di idempotenza ed execution ID
+    flow_hash = await asyncio.to_thread(_flow_fingerprint, flow)
+    execution_id = _generate_execution_id(flow_hash)
     
     # Se dry_run, restituisci solo il piano
     if dry_run:
@@ -70,109 +167,193 @@ def execute_workflow_v2(
             "timestamp": datetime.utcnow().isoformat()
         }
     
-    # 2. Esegui piano
-    bus = CommandBus()
-    registry = get_registry()
-    context: Dict[str, Dict[str, Any]] = {}  # nodeId -> {output_name: value}
-    results: List[Dict] = []
-    memo: Dict[str, str] = {}  # idem_key -> result (per idempotenza)
+    # 2. Esegui piano (un solo timestamp logico per tutta la run)
+    stamps = _template_stamps(datetime.now())
+    try:
+        compiled_steps = await asyncio.to_thread(compile_plan_to_callables, plan, specs)
+    except CompilationError as e:
+        # Piano precompilato con un tipo non (più) registrato
+        return _fail_result([], e.node_id, e.code, e.message)
+    steps = {step.node_id: step for step in compiled_steps}
+    context: Dict[Tuple[str, str], Any] = {}  # (nodeId, output_name) -> value
+    exported: Set[str] = set()  # nodi che hanno già esportato nel contesto
+    slots: List[Optional[Dict]] = [None] * len(steps)  # risultati per posizione nel piano
+    memo = cache if cache is not None else InMemoryCache()  # idem_key -> result
     
-    # Flag resume
-    skip_until = resume_from is not None
+    # Resume: salta i nodi che precedono resume_from nel piano
+    skipped = set()
+    if resume_from is not None:
+        for node_id in steps:
+            if node_id == resume_from:
+                break
+            skipped.add(node_id)
+    
+    sorter = TopologicalSorter({node_id: step.depends_on for node_id, step in steps.items()})
+    try:
+        sorter.prepare()
+    except CycleError as e:
+        cycle = e.args[1]
+        return _fail_result(
+            [],
+            cycle[0],
+            "GRAPH_CYCLE",
+            f"Il grafo contiene cicli. Nodi coinvolti: {', '.join(dict.fromkeys(cycle))}"
+        )
+    
+    # Pool dedicato (non l'executor di default del loop, condiviso con le
+    # altre richieste): limita i thread, quindi le connessioni WAAPI.
+    # Un CommandBus per thread worker, chiusi a fine esecuzione
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="wwiseflow-node")
+    local = threading.local()
+    buses: List[CommandBus] = []
+    buses_lock = threading.Lock()
+    
+    def run_spec(run: Callable, data: Dict, idem_key: Optional[str]) -> Dict:
+        bus = getattr(local, "bus", None)
+        if bus is None:
+            bus = local.bus = CommandBus()
+            with buses_lock:
+                buses.append(bus)
+        result = run(data, bus)
+        # Solo i successi in cache: un nodo fallito va rieseguito
+        if idem_key is not None and result.get("ok"):
+            memo.set(idem_key, result)
+        return result
+    
+    def lookup(node_id: str, node_type: str, data: Dict) -> Tuple[str, Optional[Dict]]:
+        # Hash e cache (es. SQLite: I/O su disco) nello stesso thread worker
+        idem_key = _idempotency_key(flow_hash, node_id, node_type, data)
+        return idem_key, memo.get(idem_key)
     
-    for step in plan:
-        node_id = step["nodeId"]
-        node_type = step["type"]
-        raw_data = step["data"]
+    semaphore = asyncio.Semaphore(max_concurrency)
+    stop_at: Optional[str] = None
+    
+    async def run_node(node_id: str):
+        nonlocal stop_at
+        step = steps[node_id]
+        node_type = step.node_type
         
         # Resume logic
-        if skip_until:
-            if node_id == resume_from:
-                skip_until = False
-            else:
-                results.append({
-                    "node": node_id,
-                    "ok": True,
-                    "skipped": True,
-                    "reason": "resume_from"
-                })
-                continue
-        
-        # 3. Risolvi riferimenti simbolici $from:...:$output:...
-        try:
-            resolved_data = _resolve_symbolic_refs(raw_data, context)
-        except KeyError as e:
-            return _fail_result(
-                results, 
-                node_id, 
-                "RESOLUTION_FAILED", 
-                f"Impossibile risolvere riferimento: {str(e)}"
-            )
-        
-        # 4. Calcola chiave di idempotenza
-        idem_key = _idempotency_key(node_id, node_type, resolved_data)
-        
-        # 5. Verifica se già eseguito (idempotenza)
-        if not force_rerun and idem_key in memo:
-            cached_result = memo[idem_key]
-            results.append({
+        if node_id in skipped:
+            slots[step.index] = {
                 "node": node_id,
                 "ok": True,
-                "idempotent": True,
-                "idemKey": idem_key,
-                "cachedResult": cached_result
-            })
-            # Usa risultato cached per contesto
-            if cached_result.get("ok"):
-                _export_outputs_to_context(
-                    node_id, 
-                    cached_result.get("data", {}), 
-                    step["spec"]["outputs"], 
-                    context
-                )
-            continue
-        
-        # 6. Esegui nodo
-        spec = registry.get(node_type)
-        if not spec:
-            return _fail_result(
-                results,
-                node_id,
-                "UNKNOWN_NODE_TYPE",
-                f"Tipo nodo non supportato: {node_type}"
-            )
-        
-        result = spec.run(resolved_data, bus)
-        
-        # 7. Memorizza risultato
-        memo[idem_key] = result
-        
-        results.append({
-            "node": node_id,
-            "ok": result.get("ok", False),
-            "result": result,
-            "idemKey": idem_key,
-            "data": resolved_data  # Dati effettivamente usati
-        })
-        
-        # 8. Interrompi se errore
-        if not result.get("ok"):
-            return {
-                "ok": False,
-                "stopped": True,
-                "stopAt": node_id,
-                "results": results,
-                "executionId": execution_id,
-                "timestamp": datetime.utcnow().isoformat()
+                "skipped": True,
+                "reason": "resume_from"
             }
+            return
         
-        # 9. Esporta output nel contesto
-        _export_outputs_to_context(
-            node_id, 
-            result.get("data", {}), 
-            step["spec"]["outputs"], 
-            context
-        )
+        async with semaphore:
+            # Un nodo fratello è già fallito: non partire
+            if stop_at is not None:
+                return
+            
+            # 3. Risolvi riferimenti simbolici $from:...:$output:...
+            try:
+                resolved_data = step.resolve(context, exported, stamps)
+            except KeyError as e:
+                slots[step.index] = _fail_entry(
+                    node_id,
+                    "RESOLUTION_FAILED",
+                    f"Impossibile risolvere riferimento: {str(e)}"
+                )
+                stop_at = stop_at or node_id
+                return
+            
+            # 4-5. Idempotenza: con force_rerun o nodi non cacheable
+            # niente chiave né lookup
+            idem_key = None
+            if not force_rerun and step.cacheable:
+                idem_key, cached_result = await asyncio.to_thread(lookup, node_id, node_type, resolved_data)
+                if cached_result is not None:
+                    slots[step.index] = {
+                        "node": node_id,
+                        "ok": True,
+                        "idempotent": True,
+                        "idemKey": idem_key,
+                        "cachedResult": cached_result
+                    }
+                    # Usa risultato cached per contesto
+                    if cached_result.get("ok"):
+                        _export_outputs_to_context(
+                            node_id, 
+                            cached_result.get("data", {}), 
+                            step.extractors, 
+                            context,
+                            exported
+                        )
+                    if on_event is not None:
+                        await on_event({
+                            "type": "node_complete",
+                            "nodeId": node_id,
+                            "ok": True,
+                            "idempotent": True,
+                            "result": cached_result
+                        })
+                    return
+            
+            # 6. Esegui nodo (WAAPI è bloccante: thread worker)
+            if on_event is not None:
+                await on_event({"type": "node_start", "nodeId": node_id, "nodeType": node_type})
+            
+            result = await loop.run_in_executor(executor, run_spec, step.run, resolved_data, idem_key)
+            
+            # 7. Memorizza risultato (la cache è già aggiornata da run_spec)
+            entry = {
+                "node": node_id,
+                "ok": result.get("ok", False),
+                "result": result
+            }
+            if idem_key is not None:
+                entry["idemKey"] = idem_key
+            if verbose:
+                entry["data"] = resolved_data  # Dati effettivamente usati
+            slots[step.index] = entry
+            
+            if on_event is not None:
+                await on_event({
+                    "type": "node_complete",
+                    "nodeId": node_id,
+                    "ok": entry["ok"],
+                    "result": result
+                })
+            
+            # 8. Interrompi se errore
+            if not result.get("ok"):
+                stop_at = stop_at or node_id
+                return
+            
+            # 9. Esporta output nel contesto (scritto solo dal thread del loop)
+            _export_outputs_to_context(
+                node_id, 
+                result.get("data", {}), 
+                step.extractors, 
+                context,
+                exported
+            )
+    
+    try:
+        while sorter.is_active() and stop_at is None:
+            ready = sorter.get_ready()
+            await asyncio.gather(*(run_node(node_id) for node_id in ready))
+            sorter.done(*ready)
+    finally:
+        executor.shutdown(wait=False)
+        for bus in buses:
+            bus.close()
+    
+    results = [entry for entry in slots if entry is not None]
+    
+    if stop_at is not None:
+        return {
+            "ok": False,
+            "stopped": True,
+            "stopAt": stop_at,
+            "results": results,
+            "executionId": execution_id,
+            "timestamp": datetime.utcnow().isoformat()
+        }
     
     return {
         "ok": True,
@@ -182,46 +363,59 @@ def execute_workflow_v2(
     }
 
 
-def _resolve_symbolic_refs(data: Dict, context: Dict) -> Dict:
+# Formato strftime per ciascun placeholder di template
+_TEMPLATE_FORMATS = {
+    "${timestamp}": "%Y%m%d%H%M%S",
+    "${HHmmss}": "%H%M%S",
+}
+
+
+def _template_stamps(now: datetime) -> Dict[str, str]:
+    """Valori dei placeholder di template, calcolati una volta per run"""
+    return {placeholder: now.strftime(fmt) for placeholder, fmt in _TEMPLATE_FORMATS.items()}
+
+
+def _literal_data(data: Dict, *_) -> Dict:
+    """Resolver degli step senza riferimenti né template"""
+    return data
+
+
+def _resolve_symbolic_refs(
+    data: Dict,
+    bindings: Dict,
+    context: Dict[Tuple[str, str], Any],
+    exported: Set[str],
+    stamps: Dict[str, str]
+) -> Dict:
     """
-    Risolve riferimenti simbolici nel formato:
-    "$from:n1:$output:objectId" -> context["n1"]["objectId"]
+    Risolve i binding pre-parsati dal compilatore (step["bindings"]):
+    ("$ref", "n1", "objectId") -> context[("n1", "objectId")]
+    ("$tmpl", "MySound_${timestamp}", "${timestamp}") -> "MySound_20241029123456"
     
-    Supporta anche template semplici:
-    "MySound_${timestamp}" -> "MySound_20241029123456"
+    stamps: placeholder -> valore (vedi _template_stamps), uguale per tutti
+    i nodi della stessa run.
+    Le chiavi senza binding sono letterali e vengono copiate così come sono.
     """
-    resolved = {}
+    resolved = dict(data)
     
-    for key, value in data.items():
-        if isinstance(value, str) and value.startswith("$from:"):
-            # Parse: $from:nodeId:$output:fieldName
-            parts = value.split(":")
-            if len(parts) != 4 or parts[2] != "$output":
-                raise KeyError(f"Formato $from invalido: {value}")
-            
-            source_node = parts[1]
-            field_name = parts[3]
-            
-            if source_node not in context:
-                raise KeyError(f"Nodo source non trovato nel contesto: {source_node}")
+    for key, binding in bindings.items():
+        tag = binding[0]
+        if tag == "$ref":
+            _, source_node, field_name = binding
             
-            if field_name not in context[source_node]:
-                raise KeyError(f"Output non trovato: {field_name} da nodo {source_node}")
-            
-            resolved[key] = context[source_node][field_name]
-        
-        elif isinstance(value, str) and "${timestamp}" in value:
-            # Template timestamp
-            timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-            resolved[key] = value.replace("${timestamp}", timestamp)
+            try:
+                resolved[key] = context[(source_node, field_name)]
+            except KeyError:
+                if source_node not in exported:
+                    raise KeyError(f"Nodo source non trovato nel contesto: {source_node}") from None
+                raise KeyError(f"Output non trovato: {field_name} da nodo {source_node}") from None
         
-        elif isinstance(value, str) and "${HHmmss}" in value:
-            # Template time-only
-            time_str = datetime.now().strftime("%H%M%S")
-            resolved[key] = value.replace("${HHmmss}", time_str)
+        elif tag == "$tmpl":
+            _, template, placeholder = binding
+            resolved[key] = template.replace(placeholder, stamps[placeholder])
         
         else:
-            resolved[key] = value
+            raise KeyError(f"Formato $from invalido: {binding[1]}")
     
     return resolved
 
@@ -229,77 +423,96 @@ def _resolve_symbolic_refs(data: Dict, context: Dict) -> Dict:
 def _export_outputs_to_context(
     node_id: str,
     result_data: Any,
-    output_fields: List[str],
-    context: Dict
+    extractors: Tuple[Tuple, Tuple],
+    context: Dict[Tuple[str, str], Any],
+    exported: Set[str]
 ):
     """
-    Estrae output dal result e li mette nel contesto.
+    Estrae gli output dichiarati dalla spec e li mette nel contesto.
     Es: result_data = {"id": "123", "name": "Sound"}
-        output_fields = ["objectId"]
-        → context["n1"] = {"objectId": "123"}
+        spec.outputs = ("objectId",)
+        → context[("n1", "objectId")] = "123"
+    
+    extractors: StepExec.extractors, cioè gli estrattori precalcolati sulla
+    NodeSpec (mapping objectId <- id incluso) per result dict e per oggetti;
+    gli output assenti nel result vengono ignorati.
     """
-    if node_id not in context:
-        context[node_id] = {}
+    exported.add(node_id)
     
     # result_data può essere dict o oggetto con attributi
-    if isinstance(result_data, dict):
-        for field in output_fields:
-            # Mapping speciale: objectId <- id
-            if field == "objectId" and "id" in result_data:
-                context[node_id][field] = result_data["id"]
-            elif field in result_data:
-                context[node_id][field] = result_data[field]
-    else:
-        # Oggetto con attributi
-        for field in output_fields:
-            if field == "objectId" and hasattr(result_data, "id"):
-                context[node_id][field] = getattr(result_data, "id")
-            elif hasattr(result_data, field):
-                context[node_id][field] = getattr(result_data, field)
+    item_extractors, attr_extractors = extractors
+    for name, extract in item_extractors if isinstance(result_data, dict) else attr_extractors:
+        try:
+            context[(node_id, name)] = extract(result_data)
+        except (KeyError, AttributeError):
+            pass
 
 
-def _idempotency_key(node_id: str, node_type: str, data: Dict) -> str:
+def _idempotency_key(flow_hash: str, node_id: str, node_type: str, data: Dict) -> str:
     """
     Genera chiave di idempotenza basata su:
+    - impronta del flow (vedi _flow_fingerprint): i nodeId di React Flow
+      ("n1", ...) si ripetono tra workflow diversi
     - node_id
     - node_type
     - hash dei dati (ordinato)
     
     Se eseguo due volte lo stesso nodo con gli stessi input,
     la chiave sarà identica.
+    
+    È un'impronta del contenuto per dedup, non un MAC: BLAKE2b a 8 byte
+    (16 caratteri hex) basta ed è più veloce di SHA-256.
     """
     payload = {
+        "flow": flow_hash,
         "nodeId": node_id,
         "type": node_type,
         "data": _stable_dict(data)
     }
-    
-    json_str = json.dumps(payload, sort_keys=True)
-    return hashlib.sha256(json_str.encode()).hexdigest()[:16]
+    return hashlib.blake2b(_canonical_json(payload), digest_size=8).hexdigest()
+
+
+def _canonical_json(obj: Any) -> bytes:
+    """JSON canonico (chiavi ordinate) in bytes, pronto per l'hasher"""
+    return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS)
+
+
+# Campi che cambiano ad ogni run ma non sono semanticamente rilevanti
+_IDEM_IGNORE_KEYS = frozenset({"timestamp", "executionId", "_internal"})
 
 
 def _stable_dict(d: Dict) -> Dict:
     """Rimuove campi non deterministici per idempotenza"""
-    # Filtra campi che cambiano ad ogni run ma non sono semanticamente rilevanti
-    ignore_keys = {"timestamp", "executionId", "_internal"}
-    return {k: v for k, v in d.items() if k not in ignore_keys}
+    # Caso comune: nessun campo da togliere, niente copia
+    if _IDEM_IGNORE_KEYS.isdisjoint(d):
+        return d
+    return {k: v for k, v in d.items() if k not in _IDEM_IGNORE_KEYS}
 
 
-def _generate_execution_id(flow: Dict) -> str:
+def _flow_fingerprint(flow: Dict) -> str:
+    """Impronta del flow (JSON canonico, BLAKE2b a 8 byte)"""
+    return hashlib.blake2b(_canonical_json(flow), digest_size=8).hexdigest()
+
+
+def _generate_execution_id(flow_hash: str) -> str:
     """Genera ID unico per questa esecuzione"""
     timestamp = datetime.utcnow().isoformat()
-    flow_hash = hashlib.md5(json.dumps(flow, sort_keys=True).encode()).hexdigest()[:8]
-    return f"exec_{flow_hash}_{timestamp}"
+    return f"exec_{flow_hash[:8]}_{timestamp}"
 
 
-def _fail_result(results: List, node_id: str, code: str, message: str) -> Dict:
-    """Helper per risultato di fallimento"""
-    results.append({
+def _fail_entry(node_id: str, code: str, message: str) -> Dict:
+    """Helper per la voce di risultato di un nodo fallito"""
+    return {
         "node": node_id,
         "ok": False,
         "code": code,
         "error": message
-    })
+    }
+
+
+def _fail_result(results: List, node_id: str, code: str, message: str) -> Dict:
+    """Helper per risultato di fallimento"""
+    results.append(_fail_entry(node_id, code, message))
     
     return {
         "ok": False,
@@ -2,17 +2,34 @@ import uvicorn
 from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Literal, Optional
 import asyncio
-import json
+import os
+import orjson
+from contextlib import asynccontextmanager
+from functools import partial
 
 from app.command_bus import CommandBus
 from app.workflow_runner_v2 import execute_workflow_v2
-from app.graph_compiler import compile_workflow, validate_workflow
+from app.graph_compiler import compile_workflow, compile_workflow_with_specs, validate_workflow
+from app.idempotency_cache import SQLiteCache
 from app.node_registry import get_registry
-from app.pywwise_adapter import PyWwiseAgent
 
-app = FastAPI(title="WwiseFlow V2")
+# Con uvicorn[standard] le chiusure lato client arrivano come ConnectionClosed
+try:
+    from websockets.exceptions import ConnectionClosed
+except ImportError:
+    ConnectionClosed = WebSocketDisconnect
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Chiude la connessione WAAPI condivisa del bus
+    bus.close()
+    if idem_cache is not None:
+        idem_cache.close()
+
+app = FastAPI(title="WwiseFlow V2", lifespan=lifespan)
 
 # CORS per frontend React
 app.add_middleware(
@@ -25,6 +42,11 @@ app.add_middleware(
 
 bus = CommandBus()
 
+# Cache di idempotenza persistente tra run e riavvii (opzionale):
+# WWISEFLOW_IDEM_CACHE=path del file SQLite; senza, cache in memoria per run
+_IDEM_CACHE_PATH = os.environ.get("WWISEFLOW_IDEM_CACHE")
+idem_cache = SQLiteCache(_IDEM_CACHE_PATH) if _IDEM_CACHE_PATH else None
+
 # ============================================
 # MODELS
 # ============================================
@@ -37,6 +59,7 @@ class WorkflowExecution(BaseModel):
     dry_run: bool = False
     resume_from: Optional[str] = None
     force_rerun: bool = False
+    verbose: bool = False
 
 
 # ============================================
@@ -49,24 +72,23 @@ def health():
 
 @app.get("/health/wwise")
 def wwise_health():
-    """Verifica connessione WAAPI"""
-    try:
-        with PyWwiseAgent() as agent:
-            info = agent.ak.wwise.core.get_info()
-            return {
-                "ok": True,
-                "connected": True,
-                "wwise": {
-                    "version": info.get("displayName", "unknown"),
-                    "platform": info.get("platform", {}).get("basePlatform", "unknown")
-                }
-            }
-    except Exception as e:
+    """Verifica connessione WAAPI (riusa la connessione condivisa del bus)"""
+    res = bus.get_info()
+    if not res.get("ok"):
         return {
             "ok": False,
             "connected": False,
-            "error": str(e)
+            "error": res.get("error")
+        }
+    info = res.get("data") or {}
+    return {
+        "ok": True,
+        "connected": True,
+        "wwise": {
+            "version": info.get("displayName", "unknown"),
+            "platform": info.get("platform", {}).get("basePlatform", "unknown")
         }
+    }
 
 @app.get("/api/nodes/list")
 def list_node_types():
@@ -115,16 +137,18 @@ def validate_workflow_endpoint(w: WorkflowExecution):
     return result
 
 @app.post("/api/workflows/execute")
-def execute_workflow_endpoint(w: WorkflowExecution):
+async def execute_workflow_endpoint(w: WorkflowExecution):
     """
     Esegue workflow compilato con gestione avanzata.
-    Supporta dry_run, resume_from, idempotenza.
+    Supporta dry_run, resume_from, idempotenza; verbose riporta i data risolti.
     """
-    result = execute_workflow_v2(
+    result = await execute_workflow_v2(
         w.flow,
         dry_run=w.dry_run,
         resume_from=w.resume_from,
-        force_rerun=w.force_rerun
+        force_rerun=w.force_rerun,
+        cache=idem_cache,
+        verbose=w.verbose
     )
     return result
 
@@ -133,26 +157,54 @@ def execute_workflow_endpoint(w: WorkflowExecution):
 # WEBSOCKET STREAMING
 # ============================================
 
+class ConnectionLimitError(RuntimeError):
+    """Raggiunto max_connections: la sessione va rifiutata"""
+
 class ConnectionManager:
-    """Gestisce connessioni WebSocket attive"""
-    def __init__(self):
+    """
+    Gestisce connessioni WebSocket attive.
+    Le modifiche al dizionario passano dal lock (mai tenuto durante I/O di
+    rete); le letture (send_event) no.
+    """
+    def __init__(self, max_connections: int = 100):
         self.active_connections: Dict[str, WebSocket] = {}
+        self.max_connections = max_connections
+        self._lock = asyncio.Lock()
     
     async def connect(self, session_id: str, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections[session_id] = websocket
+        async with self._lock:
+            # Una sessione già nota che si riconnette non conta come nuova
+            if session_id not in self.active_connections and len(self.active_connections) >= self.max_connections:
+                raise ConnectionLimitError(f"Limite connessioni WebSocket raggiunto ({self.max_connections})")
+            # Prenota il posto; l'handshake avviene fuori dal lock
+            self.active_connections[session_id] = websocket
+        try:
+            await websocket.accept()
+        except Exception:
+            await self.disconnect(session_id, websocket)
+            raise
     
-    def disconnect(self, session_id: str):
-        if session_id in self.active_connections:
-            del self.active_connections[session_id]
+    async def disconnect(self, session_id: str, websocket: Optional[WebSocket] = None):
+        """
+        Rimuove la sessione. Con websocket, solo se è ancora quella registrata:
+        la chiusura di una connessione vecchia non butta fuori chi si è
+        riconnesso con lo stesso session_id.
+        """
+        async with self._lock:
+            if websocket is None or self.active_connections.get(session_id) is websocket:
+                self.active_connections.pop(session_id, None)
     
     async def send_event(self, session_id: str, event: Dict):
-        if session_id in self.active_connections:
-            websocket = self.active_connections[session_id]
+        websocket = self.active_connections.get(session_id)
+        if websocket is not None:
             try:
-                await websocket.send_json(event)
-            except:
-                self.disconnect(session_id)
+                # orjson serializza direttamente in bytes; frame di testo per il client JS.
+                # default=str: i result possono contenere oggetti arbitrari (fallback
+                # __dict__ di _to_plain) e un evento non serializzabile non deve
+                # interrompere la run
+                await websocket.send_text(orjson.dumps(event, default=str).decode())
+            except (WebSocketDisconnect, ConnectionClosed, RuntimeError):
+                await self.disconnect(session_id, websocket)
 
 manager = ConnectionManager()
 
@@ -168,7 +220,14 @@ async def workflow_stream(websocket: WebSocket, session_id: str):
     - {"type": "workflow_complete", "ok": true}
     - {"type": "workflow_error", "error": "...", "nodeId": "..."}
     """
-    await manager.connect(session_id, websocket)
+    try:
+        await manager.connect(session_id, websocket)
+    except ConnectionLimitError:
+        # 1013: "try again later". Il close code arriva al client solo a
+        # handshake completato: chiuso prima di accept, l'ASGI risponde 403
+        await websocket.accept()
+        await websocket.close(code=1013)
+        return
     
     try:
         while True:
@@ -178,82 +237,67 @@ async def workflow_stream(websocket: WebSocket, session_id: str):
             # Se riceve un workflow, eseguilo con streaming
             if data:
                 try:
-                    payload = json.loads(data)
+                    payload = orjson.loads(data)
                     flow = payload.get("flow")
                     
                     if flow:
                         await _execute_with_streaming(session_id, flow)
-                except json.JSONDecodeError:
-                    await websocket.send_json({
+                except orjson.JSONDecodeError:
+                    await websocket.send_text(orjson.dumps({
                         "type": "error",
                         "message": "Invalid JSON"
-                    })
+                    }).decode())
     
     except WebSocketDisconnect:
-        manager.disconnect(session_id)
+        pass
+    finally:
+        # Anche su payload non validi o errori del runner: la sessione
+        # non deve restare a occupare un posto sotto max_connections
+        await manager.disconnect(session_id, websocket)
 
 async def _execute_with_streaming(session_id: str, flow: Dict):
     """Esegue workflow emettendo eventi via WebSocket"""
+    send = partial(manager.send_event, session_id)
     
     # Compila
-    await manager.send_event(session_id, {
+    await send({
         "type": "compilation_start"
     })
     
-    compilation = compile_workflow(flow)
+    # Compilazione CPU-bound: in un thread per non bloccare il loop
+    compilation, specs = await asyncio.to_thread(compile_workflow_with_specs, flow)
     
     if not compilation["ok"]:
-        await manager.send_event(session_id, {
+        await send({
             "type": "compilation_error",
             "errors": compilation["errors"]
         })
         return
     
-    await manager.send_event(session_id, {
+    await send({
         "type": "compilation_complete",
         "plan": compilation["plan"]
     })
     
-    # Esegui con eventi
-    plan = compilation["plan"]
-    context = {}
-    
-    await manager.send_event(session_id, {
+    # Esegui con eventi: node_start/node_complete arrivano dal runner
+    await send({
         "type": "execution_start",
-        "nodeCount": len(plan)
+        "nodeCount": len(compilation["plan"])
     })
     
-    for step in plan:
-        node_id = step["nodeId"]
-        
-        await manager.send_event(session_id, {
-            "type": "node_start",
-            "nodeId": node_id,
-            "type": step["type"]
-        })
-        
-        # Simula esecuzione (in realtà chiameresti il runner qui)
-        await asyncio.sleep(0.5)  # Simula latenza
-        
-        # TODO: integrare con runner reale
-        result = {"ok": True, "data": {"id": f"obj_{node_id}"}}
-        
-        await manager.send_event(session_id, {
-            "type": "node_complete",
+    result = await execute_workflow_v2(flow, cache=idem_cache, on_event=send, precompiled=compilation, specs=specs)
+    
+    if not result["ok"]:
+        node_id = result.get("stopAt")
+        failed = next((r for r in result["results"] if r["node"] == node_id), {})
+        await send({
+            "type": "execution_error",
             "nodeId": node_id,
-            "ok": result["ok"],
-            "result": result
+            "error": failed.get("error") or failed.get("result", {}).get("error")
         })
-        
-        if not result["ok"]:
-            await manager.send_event(session_id, {
-                "type": "execution_error",
-                "nodeId": node_id,
-                "error": result.get("error")
-            })
-            return
+        return
     
-    await manager.send_event(session_id, {
+    await send({
         "type": "execution_complete",
         "ok": True
     })
@@ -263,30 +307,17 @@ async def _execute_with_streaming(session_id: str, flow: Dict):
 # ATOMIC COMMANDS (backward compatibility)
 # ============================================
 
-@app.post("/api/wwise/create-sound")
-def create_sound(p: Payload):
-    res = bus.create_sound(p.payload)
-    if not res.get("ok"):
-        raise HTTPException(400, res.get("error"))
-    return res
-
-@app.post("/api/wwise/set-output-bus")
-def set_output_bus(p: Payload):
-    res = bus.set_output_bus(p.payload)
-    if not res.get("ok"):
-        raise HTTPException(400, res.get("error"))
-    return res
-
-@app.post("/api/wwise/audio-import")
-def audio_import(p: Payload):
-    res = bus.audio_import(p.payload)
-    if not res.get("ok"):
-        raise HTTPException(400, res.get("error"))
-    return res
+# op del path -> metodo del bus; i vecchi path /api/wwise/<op> restano validi
+_WWISE_OPS = {
+    "create-sound": bus.create_sound,
+    "set-output-bus": bus.set_output_bus,
+    "audio-import": bus.audio_import,
+    "project-save": bus.project_save,
+}
 
-@app.post("/api/wwise/project-save")
-def project_save(p: Payload):
-    res = bus.project_save(p.payload)
+@app.post("/api/wwise/{op}")
+def wwise_command(op: Literal["create-sound", "set-output-bus", "audio-import", "project-save"], p: Payload):
+    res = _WWISE_OPS[op](p.payload)
     if not res.get("ok"):
         raise HTTPException(400, res.get("error"))
     return res
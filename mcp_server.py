@@ -2,6 +2,7 @@
 import asyncio
 from typing import Any, Dict
 
+import orjson
 from mcp.server import Server
 from mcp.server.stdio import stdio_server   # <— questo è il trasporto stdio
 from mcp.types import Tool, TextContent
@@ -86,12 +87,16 @@ async def call_tool(name: str, arguments: Dict[str, Any] | None) -> list[TextCon
         res = execute_workflow(arguments["flow"], dry_run=arguments.get("dry_run", False))
     else:
         return [TextContent(type="text", text=f"Unknown tool: {name}")]
-    return [TextContent(type="text", text=str(res))]
+    # JSON strutturato invece del repr Python; default=str per valori non serializzabili
+    return [TextContent(type="text", text=orjson.dumps(res, default=str).decode())]
 
 async def main():
     # avvia il server MCP su STDIO (compatibile con Cline/CLI)
-    async with stdio_server() as (read, write):
-        await server.run(read, write)
+    try:
+        async with stdio_server() as (read, write):
+            await server.run(read, write)
+    finally:
+        bus.close()
 
 if __name__ == "__main__":
     asyncio.run(main())